@@ -1,3 +1,4 @@
+import os
 from argparse import ArgumentParser
 
 
@@ -27,7 +28,20 @@ def argument_parser() -> ArgumentParser:
     commit_tree.add_argument("-m", help="commit message", type=str, required=True)
 
     clone = subparsers.add_parser("clone", help="Clone a repository")
-    clone.add_argument("url", help="URL of the repository to clone")
-    clone.add_argument("path", help="Relative path to clone the repository to")
+    clone.add_argument("url", help="URL of the repository to clone", nargs="?")
+    clone.add_argument("path", help="Relative path to clone the repository to", nargs="?")
+    clone.add_argument("--reference", help="Repository whose objects are shared instead of downloaded", type=str)
+    clone.add_argument("--many", help="File with one \"{url} [{path}]\" per line, to clone concurrently", type=str)
+    clone.add_argument("--jobs", help="Max concurrent connections with --many", type=int, default=16)
+    clone.add_argument("--per-host", help="Max concurrent connections to a host with --many", type=int, default=4)
+    clone.add_argument("--workers", help="Processes unpacking and checking out with --many", type=int,
+                       default=os.cpu_count())
+
+    fsck = subparsers.add_parser("fsck", help="Verify the connectivity and validity of the objects")
+    fsck.add_argument("--jobs", help="Processes checking objects", type=int, default=os.cpu_count())
+
+    verify_pack = subparsers.add_parser("verify-pack", help="Validate a pack-file and its index")
+    verify_pack.add_argument("pack", help="Path to the .pack or .idx file", type=str)
+    verify_pack.add_argument("--jobs", help="Processes checking objects", type=int, default=os.cpu_count())
 
     return parser
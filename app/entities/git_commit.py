@@ -36,13 +36,16 @@ class Commit(NamedTuple):
         assert git_object.object_type == ObjectType.COMMIT
 
         content = git_object.content.decode()
-        tree_line, parent_line, author_line, committer_line, _, message = content.split("\n", maxsplit=5)
+        headers, message = content.split("\n\n", maxsplit=1)
+        tree_line, *header_lines = headers.split("\n")
 
         assert tree_line.startswith("tree ")
         tree_id = tree_line[5:]
 
-        assert parent_line.startswith("parent ")
-        parent_commit_id = parent_line[7:]
+        # First commit has no parent line
+        parent_commit_id = None
+        if header_lines[0].startswith("parent "):
+            parent_commit_id = header_lines[0][7:]
 
         # TODO: implement deserialization of the author/committer line
         author_name = ""
@@ -1,9 +1,16 @@
+from __future__ import annotations
+
 import enum
 import hashlib
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import zlib
 
+if TYPE_CHECKING:
+    from app.entities.git_pack_file import PackReader
+
 
 class ObjectType(str, enum.Enum):
     TREE = "tree"
@@ -43,8 +50,100 @@ def get_object_path(dot_git: Path, object_id: str) -> Path:
     return dot_git / "objects" / object_id[:2] / object_id[2:]
 
 
-def retrieve_object_by_id(dot_git: Path, object_id: str) -> GitObject:
+def get_alternates_path(dot_git: Path) -> Path:
+    return dot_git / "objects" / "info" / "alternates"
+
+
+def object_directories(dot_git: Path) -> list[Path]:
+    """
+    Returns the repository's own objects directory followed by every shared object directory listed
+    (transitively) in objects/info/alternates, see `man gitrepository-layout`
+    """
+    directories = []
+    pending = [dot_git / "objects"]
+
+    while pending:
+        objects_dir = pending.pop(0).resolve()
+        if objects_dir in directories or not objects_dir.is_dir():
+            continue
+        directories.append(objects_dir)
+
+        alternates = objects_dir / "info" / "alternates"
+        if not alternates.is_file():
+            continue
+        for line in alternates.read_text().splitlines():
+            line = line.strip()
+            # Empty lines and comments are ignored, relative paths are relative to the objects directory
+            if line and not line.startswith("#"):
+                pending.append(objects_dir / line)
+
+    return directories
+
+
+def alternate_object_directories(dot_git: Path) -> list[Path]:
+    # The alternates file lives inside the repository's own objects directory, so when there are alternates
+    # that directory exists and is always the first one
+    return object_directories(dot_git)[1:]
+
+
+def find_object_path(dot_git: Path, object_id: str, alternates: list[Path] | None = None) -> Path | None:
+    """
+    `alternates` are the directories from `alternate_object_directories`, callers looking up many objects
+    should compute them once instead of reading objects/info/alternates on every miss
+    """
+    # Most lookups hit the repository's own objects, so we check them before reading any alternates
     obj_path = get_object_path(dot_git, object_id)
+    if obj_path.exists():
+        return obj_path
+
+    if alternates is None:
+        alternates = alternate_object_directories(dot_git)
+    for objects_dir in alternates:
+        obj_path = objects_dir / object_id[:2] / object_id[2:]
+        if obj_path.exists():
+            return obj_path
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def _packs_in(objects_dir: Path) -> tuple[PackReader, ...]:
+    # git_pack_file builds on GitObject, so it can only be imported once this module is loaded
+    from app.entities.git_pack_file import PackReader
+
+    # Packs are named after their checksum and never change, new ones showing up while a command runs are ignored
+    return tuple(PackReader(idx_path.with_suffix(".pack")) for idx_path in sorted(objects_dir.glob("pack/*.idx")))
+
+
+def find_packed_object(dot_git: Path, object_id: str, alternates: list[Path] | None = None) -> PackReader | None:
+    if alternates is None:
+        alternates = alternate_object_directories(dot_git)
+
+    for objects_dir in [dot_git / "objects", *alternates]:
+        for pack_reader in _packs_in(objects_dir):
+            if object_id in pack_reader:
+                return pack_reader
+
+    return None
+
+
+def has_object(dot_git: Path, object_id: str, alternates: list[Path] | None = None) -> bool:
+    if find_object_path(dot_git, object_id, alternates) is not None:
+        return True
+    return find_packed_object(dot_git, object_id, alternates) is not None
+
+
+def retrieve_object_by_id(dot_git: Path, object_id: str) -> GitObject:
+    obj_path = find_object_path(dot_git, object_id)
+    if obj_path is None:
+        pack_reader = find_packed_object(dot_git, object_id)
+        if pack_reader is None:
+            raise FileNotFoundError(f"Object {object_id} not found in {dot_git}")
+
+        git_object = GitObject(*pack_reader.read_object_by_id(object_id))
+        assert git_object.object_id == object_id, f"Object {object_id} is corrupt, it hashes to {git_object.object_id}"
+        return git_object
+
     stream = zlib.decompress(obj_path.read_bytes())
 
     # blob 12\x00* text=auto\n
@@ -53,4 +152,7 @@ def retrieve_object_by_id(dot_git: Path, object_id: str) -> GitObject:
     object_type_str, length_str = header.decode().split(" ", maxsplit=1)
     assert len(content) == int(length_str)
 
-    return GitObject(ObjectType(object_type_str), content)
+    git_object = GitObject(ObjectType(object_type_str), content)
+    assert git_object.object_id == object_id, f"Object {object_id} is corrupt, it hashes to {git_object.object_id}"
+
+    return git_object
@@ -1,8 +1,19 @@
+import hashlib
+import logging
+import mmap
+import struct
 from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+import zlib
 
 from app.entities.git_object import ObjectType, GitObject
 from app.utils import decompress
 
+_logger = logging.getLogger(__name__)
+
 
 class PackObjectType(Enum):
     OBJ_COMMIT = 1
@@ -21,7 +32,18 @@ class PackObjectType(Enum):
         }[self]
 
 
-def unpack_objects(pack_file: bytes):
+def verify_pack_checksum(pack_file: bytes | memoryview) -> memoryview:
+    """
+    Checks the trailer, which is the SHA-1 of everything before it, returns the objects of the pack:
+    what's between the 12 bytes header (magic + version + n_items) and the 20 bytes trailer
+    """
+    pack_file = memoryview(pack_file)
+    assert hashlib.sha1(pack_file[:-20]).digest() == pack_file[-20:], "Pack-file checksum mismatch"
+
+    return pack_file[12:-20]
+
+
+def unpack_objects(pack_file: bytes | memoryview):
     git_objects: dict[str, GitObject] = {}
 
     while pack_file:
@@ -30,7 +52,7 @@ def unpack_objects(pack_file: bytes):
             base_sha_1 = pack_file[data_start:data_start + 20].hex()
             data_start += 20
         data, pack_file = decompress(pack_file[data_start:])
-        print(f_type, f_size)
+        _logger.debug("%s %s", f_type, f_size)
 
         if f_type == PackObjectType.OBJ_REF_DELTA:
             base_object = git_objects[base_sha_1]
@@ -44,6 +66,130 @@ def unpack_objects(pack_file: bytes):
     return git_objects.values()
 
 
+class PackIndexEntry(NamedTuple):
+    object_id: str
+    offset: int
+    # CRC32 of the object as stored in the pack: header and compressed data
+    crc32: int
+
+
+def read_pack_index(idx_file: bytes) -> list[PackIndexEntry]:
+    """
+    Parses a version 2 .idx file, see `man gitformat-pack`:
+    magic + version, 256 fan-out counters, then the sorted sha1s, their CRC32s and their pack offsets.
+    Offsets that don't fit in 31 bits point to a table of 8 bytes offsets
+    """
+    assert idx_file[:4] == b"\xfftOc"
+    version = struct.unpack('>I', idx_file[4:8])[0]
+    assert version == 2
+
+    # Last fan-out counter is the number of objects
+    n_items = struct.unpack('>I', idx_file[8 + 255 * 4:8 + 256 * 4])[0]
+    ids_start = 8 + 256 * 4
+    crc_start = ids_start + 20 * n_items
+    offsets_start = crc_start + 4 * n_items
+    large_offsets_start = offsets_start + 4 * n_items
+
+    crcs = struct.unpack(f'>{n_items}I', idx_file[crc_start:offsets_start])
+    offsets = struct.unpack(f'>{n_items}I', idx_file[offsets_start:large_offsets_start])
+
+    entries = list()
+    for i, (crc, offset) in enumerate(zip(crcs, offsets)):
+        if offset & 0x8000_0000:
+            large_offset = large_offsets_start + 8 * (offset & 0x7fff_ffff)
+            offset = struct.unpack('>Q', idx_file[large_offset:large_offset + 8])[0]
+        object_id = idx_file[ids_start + 20 * i:ids_start + 20 * (i + 1)].hex()
+        entries.append(PackIndexEntry(object_id, offset, crc))
+
+    return entries
+
+
+def read_object_header(pack_file: bytes, offset: int) -> tuple[PackObjectType, int, int]:
+    """
+    Returns the type, the inflated size and the offset where the data starts (for deltas, the base reference)
+    """
+    byte = pack_file[offset]
+    # First byte is [1 bit for MSB][3 bits for type][4 bits for size], next ones are [1 bit for MSB][7 bits for size]
+    obj_type = PackObjectType((byte >> 4) & 0b0111)
+    obj_size = byte & 0b0000_1111
+    shift = 4
+
+    while byte >> 7:
+        offset += 1
+        byte = pack_file[offset]
+        obj_size |= (byte & 0b0111_1111) << shift
+        shift += 7
+
+    return obj_type, obj_size, offset + 1
+
+
+def _read_base_distance(pack_file: bytes, offset: int) -> tuple[int, int]:
+    # OBJ_OFS_DELTA bases are "negative" offsets, big-endian, with 1 added to every byte but the last one
+    byte = pack_file[offset]
+    distance = byte & 0b0111_1111
+
+    while byte >> 7:
+        offset += 1
+        byte = pack_file[offset]
+        distance = ((distance + 1) << 7) | (byte & 0b0111_1111)
+
+    return distance, offset + 1
+
+
+class PackReader:
+    """
+    Random access to the objects of a pack-file on disk through its .idx file
+    """
+
+    def __init__(self, pack_path: Path, cache_size: int = 1024):
+        with pack_path.open("rb") as f:
+            self.pack_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = read_pack_index(pack_path.with_suffix(".idx").read_bytes())
+        self._offsets = {entry.object_id: entry.offset for entry in self.index}
+
+        # Delta chains share their bases, so we keep the most recent ones inflated
+        self.read_object = lru_cache(maxsize=cache_size)(self._read_object)
+
+    def __contains__(self, object_id: str) -> bool:
+        return object_id in self._offsets
+
+    def read_object_by_id(self, object_id: str) -> tuple[ObjectType, bytes]:
+        return self.read_object(self._offsets[object_id])
+
+    def _read_object(self, offset: int) -> tuple[ObjectType, bytes]:
+        obj_type, obj_size, data_start = read_object_header(self.pack_file, offset)
+
+        match obj_type:
+            case PackObjectType.OBJ_OFS_DELTA:
+                distance, data_start = _read_base_distance(self.pack_file, data_start)
+                base_type, base_content = self.read_object(offset - distance)
+            case PackObjectType.OBJ_REF_DELTA:
+                base_sha_1 = self.pack_file[data_start:data_start + 20].hex()
+                data_start += 20
+                base_type, base_content = self.read_object(self._offsets[base_sha_1])
+
+        data = _inflate_at(self.pack_file, data_start)
+        assert len(data) == obj_size
+
+        if obj_type in (PackObjectType.OBJ_OFS_DELTA, PackObjectType.OBJ_REF_DELTA):
+            return base_type, bytes(_reconstruct_delta(base_content, data))
+        return obj_type.object_type(), data
+
+
+def _inflate_at(pack_file: bytes, offset: int, read_size: int = 64 * 1024) -> bytes:
+    # The compressed data ends where zlib says, feeding it in pieces avoids copying the rest of the pack
+    d = zlib.decompressobj()
+    data = bytearray()
+
+    while not d.eof:
+        chunk = pack_file[offset:offset + read_size]
+        assert chunk, "Truncated pack-file"
+        data.extend(d.decompress(chunk))
+        offset += read_size
+
+    return bytes(data)
+
+
 def _iterate_pack_file_until_data(pack_binary):
     obj_type = None
     obj_size = 0
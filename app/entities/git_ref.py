@@ -8,3 +8,23 @@ class Ref(NamedTuple):
 
     def store(self, dot_git: Path) -> None:
         (dot_git / self.name).write_text(f"{self.target}\n")
+
+
+def read_refs(dot_git: Path) -> list[Ref]:
+    refs = dict()
+
+    # Refs packed by git live in a single file with the format "{sha1} {ref name}", loose refs take precedence
+    packed_refs = dot_git / "packed-refs"
+    if packed_refs.is_file():
+        for line in packed_refs.read_text().splitlines():
+            # Comments hold the file traits, and "^{sha1}" lines the peeled commit of the previous annotated tag
+            if not line or line.startswith(("#", "^")):
+                continue
+            target, name = line.split(" ", maxsplit=1)
+            refs[name] = target
+
+    for path in sorted((dot_git / "refs").rglob("*")):
+        if path.is_file():
+            refs[path.relative_to(dot_git).as_posix()] = path.read_text().strip()
+
+    return [Ref(name, target) for name, target in refs.items()]
@@ -10,6 +10,10 @@ from app.entities.git_object import GitObject, ObjectType, retrieve_object_by_id
 class FileMode(enum.Enum):
     DIRECTORY = "40000"
     REGULAR_FILE = "100644"
+    EXECUTABLE_FILE = "100755"
+    SYMLINK = "120000"
+    # Commit of a submodule, the object lives in another repository
+    GITLINK = "160000"
 
     def __str__(self):
         return self.value
@@ -36,7 +40,7 @@ class Tree(NamedTuple):
 
             # Hash 40 chars, encoded in hex, is 20 bytes
             object_sha1 = content[null_char + 1:null_char + 21].hex()
-            file_mode, file_name = content[:null_char].decode("utf-8").split(" ")
+            file_mode, file_name = content[:null_char].decode("utf-8").split(" ", maxsplit=1)
             tree_item = TreeItem(FileMode(file_mode), file_name, object_sha1)
 
             items.append(tree_item)
@@ -68,10 +72,22 @@ class Tree(NamedTuple):
 
                     subtree = Tree.from_git_object(tree_git_obj)
                     subtree.restore(dot_git, file_path)
-                case FileMode.REGULAR_FILE:
+                case FileMode.REGULAR_FILE | FileMode.EXECUTABLE_FILE:
                     blob_object = retrieve_object_by_id(dot_git, tree_item.object_id)
                     assert blob_object.object_type == ObjectType.BLOB
                     file_path.write_bytes(blob_object.content)
+                    if tree_item.file_mode == FileMode.EXECUTABLE_FILE:
+                        file_path.chmod(0o755)
+                case FileMode.SYMLINK:
+                    # The blob holds the target of the link
+                    blob_object = retrieve_object_by_id(dot_git, tree_item.object_id)
+                    assert blob_object.object_type == ObjectType.BLOB
+                    file_path.symlink_to(blob_object.content.decode("utf-8"))
+                case FileMode.GITLINK:
+                    # The submodule commit lives in another repository, like git we only create its empty directory
+                    file_path.mkdir()
+                case _:
+                    raise RuntimeError(f"Unsupported file mode {tree_item.file_mode} for {file_path}")
 
 
 def build_tree(dot_git: Path, current_dir: Path) -> str | None:
@@ -0,0 +1,256 @@
+import hashlib
+import math
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor, Future
+from pathlib import Path
+from typing import NamedTuple, Iterable
+
+from app.entities.git_object import GitObject, ObjectType, object_directories
+from app.entities.git_pack_file import PackReader, read_pack_index, PackIndexEntry
+from app.entities.git_ref import read_refs
+from app.entities.git_tree import Tree, FileMode
+
+# Hashing the pack trailer reads the file in pieces of this size
+_READ_SIZE = 1024 * 1024
+
+
+class IntegrityReport(NamedTuple):
+    n_objects: int
+    # Inflated size of the objects, which is what we hash
+    n_bytes: int
+    errors: list[str]
+
+    def __add__(self, other: "IntegrityReport") -> "IntegrityReport":
+        return IntegrityReport(
+            self.n_objects + other.n_objects,
+            self.n_bytes + other.n_bytes,
+            self.errors + other.errors,
+        )
+
+    def summary(self, elapsed: float) -> str:
+        # Avoid dividing by zero on empty repositories
+        elapsed = max(elapsed, 1e-6)
+        mib = self.n_bytes / (1024 * 1024)
+        return (
+            f"{self.n_objects} objects, {mib:.1f} MiB in {elapsed:.2f}s "
+            f"({self.n_objects / elapsed:.0f} objects/s, {mib / elapsed:.1f} MiB/s), {len(self.errors)} errors"
+        )
+
+
+# Worker state, every process of the pool opens each pack once and keeps it
+_known_object_ids: frozenset[str] | None = None
+_pack_readers: dict[Path, PackReader] = dict()
+
+
+def _init_worker(known_object_ids: frozenset[str] | None) -> None:
+    global _known_object_ids
+    _known_object_ids = known_object_ids
+
+
+def verify_pack(pack_path: Path, jobs: int) -> IntegrityReport:
+    """
+    Checks the trailers of the pack and its index, the CRC32 of every object and re-hashes every object
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(None,)) as executor:
+        futures = _submit_pack(executor, pack_path, jobs)
+        return _collect(futures)
+
+
+def fsck(dot_git: Path, jobs: int) -> IntegrityReport:
+    """
+    Re-hashes every loose and packed object of the repository and checks that refs, commits, tags and trees
+    only point at objects that exist, either in the repository or in its alternates
+    """
+    objects_dir = dot_git / "objects"
+    loose_objects = _list_loose_objects(objects_dir)
+    packs = sorted(objects_dir.glob("pack/*.pack"))
+
+    known_object_ids = set(object_id for object_id, _ in loose_objects)
+    for pack_path in packs:
+        known_object_ids.update(entry.object_id for entry in _read_index(pack_path))
+    for alternate_dir in object_directories(dot_git)[1:]:
+        known_object_ids.update(object_id for object_id, _ in _list_loose_objects(alternate_dir))
+        for pack_path in alternate_dir.glob("pack/*.pack"):
+            known_object_ids.update(entry.object_id for entry in _read_index(pack_path))
+
+    # Symbolic refs like "ref: refs/heads/master" point at other refs, not at objects
+    errors = [
+        f"error: ref {ref.name} points at missing object {ref.target}"
+        for ref in read_refs(dot_git)
+        if not ref.target.startswith("ref: ") and ref.target not in known_object_ids
+    ]
+
+    initargs = (frozenset(known_object_ids),)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        futures = [
+            executor.submit(_check_loose_objects, chunk)
+            for chunk in _chunks(loose_objects, jobs)
+        ]
+        for pack_path in packs:
+            futures.extend(_submit_pack(executor, pack_path, jobs))
+
+        return IntegrityReport(0, 0, errors) + _collect(futures)
+
+
+def _submit_pack(executor: ProcessPoolExecutor, pack_path: Path, jobs: int) -> list[Future]:
+    index = sorted(_read_index(pack_path), key=lambda entry: entry.offset)
+
+    # Each object ends where the next one starts, the last one where the 20 bytes trailer starts
+    ends = [entry.offset for entry in index[1:]] + [pack_path.stat().st_size - 20]
+    objects = list(zip(index, ends))
+
+    # Hashing the whole pack is serial, so it runs next to the object checks instead of before them
+    futures = [executor.submit(_check_pack_trailer, pack_path, len(index))]
+    futures.extend(executor.submit(_check_packed_objects, pack_path, chunk) for chunk in _chunks(objects, jobs))
+    return futures
+
+
+def _collect(futures: Iterable[Future]) -> IntegrityReport:
+    report = IntegrityReport(0, 0, [])
+    for future in futures:
+        report += future.result()
+
+    return report
+
+
+def _chunks(items: list, jobs: int) -> list[list]:
+    # A few chunks per worker, so a slow chunk (a long delta chain, a big blob) doesn't leave the others idle
+    if not items:
+        return []
+    size = math.ceil(len(items) / (jobs * 4))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _read_index(pack_path: Path) -> list[PackIndexEntry]:
+    return read_pack_index(pack_path.with_suffix(".idx").read_bytes())
+
+
+def _list_loose_objects(objects_dir: Path) -> list[tuple[str, Path]]:
+    loose_objects = list()
+
+    for directory in sorted(objects_dir.iterdir()):
+        # Loose objects live in directories named after the first 2 HEX characters of their id
+        if len(directory.name) != 2 or not directory.is_dir():
+            continue
+        for path in sorted(directory.iterdir()):
+            loose_objects.append((directory.name + path.name, path))
+
+    return loose_objects
+
+
+def _check_pack_trailer(pack_path: Path, n_indexed: int) -> IntegrityReport:
+    errors = list()
+    idx_file = pack_path.with_suffix(".idx").read_bytes()
+
+    # Trailer is the SHA-1 of everything before it
+    sha1 = hashlib.sha1()
+    with pack_path.open("rb") as f:
+        header = f.read(12)
+        sha1.update(header)
+        remaining = pack_path.stat().st_size - 20 - len(header)
+        while remaining > 0:
+            chunk = f.read(min(_READ_SIZE, remaining))
+            sha1.update(chunk)
+            remaining -= len(chunk)
+        trailer = f.read(20)
+
+    if header[:4] != b"PACK" or struct.unpack('>I', header[4:8])[0] != 2:
+        errors.append(f"error: {pack_path} is not a version 2 pack-file")
+    elif struct.unpack('>I', header[8:12])[0] != n_indexed:
+        errors.append(f"error: {pack_path} has {struct.unpack('>I', header[8:12])[0]} objects, index has {n_indexed}")
+    if sha1.digest() != trailer:
+        errors.append(f"error: {pack_path} checksum mismatch")
+    # The index ends with the checksum of the pack and its own checksum
+    if idx_file[-40:-20] != trailer:
+        errors.append(f"error: {pack_path.with_suffix('.idx')} belongs to another pack-file")
+    if hashlib.sha1(idx_file[:-20]).digest() != idx_file[-20:]:
+        errors.append(f"error: {pack_path.with_suffix('.idx')} checksum mismatch")
+
+    return IntegrityReport(0, 0, errors)
+
+
+def _check_packed_objects(pack_path: Path, objects: list[tuple[PackIndexEntry, int]]) -> IntegrityReport:
+    if pack_path not in _pack_readers:
+        _pack_readers[pack_path] = PackReader(pack_path)
+    pack_reader = _pack_readers[pack_path]
+
+    n_bytes = 0
+    errors = list()
+    for entry, end in objects:
+        if zlib.crc32(pack_reader.pack_file[entry.offset:end]) != entry.crc32:
+            errors.append(f"error: {entry.object_id} CRC32 mismatch in {pack_path}")
+            continue
+        try:
+            object_type, content = pack_reader.read_object(entry.offset)
+        except Exception as e:
+            errors.append(f"error: {entry.object_id} can't be read from {pack_path}: {e!r}")
+            continue
+
+        n_bytes += len(content)
+        errors.extend(_check_object(entry.object_id, GitObject(object_type, content)))
+
+    return IntegrityReport(len(objects), n_bytes, errors)
+
+
+def _check_loose_objects(loose_objects: list[tuple[str, Path]]) -> IntegrityReport:
+    n_bytes = 0
+    errors = list()
+    for object_id, path in loose_objects:
+        try:
+            stream = zlib.decompress(path.read_bytes())
+            header, content = stream.split(b"\0", maxsplit=1)
+            object_type_str, length_str = header.decode().split(" ", maxsplit=1)
+            object_type = ObjectType(object_type_str)
+        except Exception as e:
+            errors.append(f"error: {object_id} can't be read from {path}: {e!r}")
+            continue
+
+        if len(content) != int(length_str):
+            errors.append(f"error: {object_id} has {len(content)} bytes, its header says {length_str}")
+            continue
+
+        n_bytes += len(content)
+        errors.extend(_check_object(object_id, GitObject(object_type, content)))
+
+    return IntegrityReport(len(loose_objects), n_bytes, errors)
+
+
+def _check_object(object_id: str, git_object: GitObject) -> list[str]:
+    if git_object.object_id != object_id:
+        return [f"error: sha1 mismatch {object_id}, content hashes to {git_object.object_id}"]
+    # verify-pack doesn't check connectivity
+    if _known_object_ids is None:
+        return []
+
+    try:
+        references = list(_referenced_objects(git_object))
+    except Exception as e:
+        return [f"error: {git_object.object_type} {object_id} can't be parsed: {e!r}"]
+
+    return [
+        f"error: {git_object.object_type} {object_id} points at missing {kind} {referenced_id}"
+        for kind, referenced_id in references
+        if referenced_id not in _known_object_ids
+    ]
+
+
+def _referenced_objects(git_object: GitObject) -> Iterable[tuple[str, str]]:
+    match git_object.object_type:
+        case ObjectType.TREE:
+            for tree_item in Tree.from_git_object(git_object).items:
+                match tree_item.file_mode:
+                    # Submodule commits live in other repositories
+                    case FileMode.GITLINK:
+                        continue
+                    case FileMode.DIRECTORY:
+                        yield "tree", tree_item.object_id
+                    case _:
+                        yield "blob", tree_item.object_id
+        case ObjectType.COMMIT | ObjectType.TAG:
+            # Headers end at the first empty line, the message follows
+            headers = git_object.content.split(b"\n\n", maxsplit=1)[0].decode()
+            for line in headers.split("\n"):
+                key, _, value = line.partition(" ")
+                if key in ("tree", "parent", "object"):
+                    yield key, value
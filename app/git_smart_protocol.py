@@ -1,7 +1,8 @@
 import struct
 from http import HTTPStatus
+from urllib.parse import urlsplit, urlunsplit
 
-from app.http_client import GetRequest, make_http_request, PostRequest
+from app.http_client import GetRequest, make_http_request, PostRequest, Response, make_async_http_request
 
 CAPABILITIES = [
     "command=fetch",
@@ -25,9 +26,20 @@ def get_main_ref(repo_url: str):
     """
     Info with
     GIT_TRACE_PACKET=1 git ls-remote https://github.com/rohitpaulk/minimal-git-repo
+
+    Returns the sha1 of main/master and the URL to fetch from, which changes when the server redirects us
     """
+    response = make_http_request(_info_refs_request(repo_url))
+    return _parse_main_ref(response), _repository_url(response, repo_url)
+
+
+async def get_main_ref_async(repo_url: str):
+    response = await make_async_http_request(_info_refs_request(repo_url))
+    return _parse_main_ref(response), _repository_url(response, repo_url)
 
-    info_refs_request = GetRequest(
+
+def _info_refs_request(repo_url: str) -> GetRequest:
+    return GetRequest(
         base_url=repo_url + "/info/refs",
         url_params={
             "service": "git-upload-pack",
@@ -36,9 +48,19 @@ def get_main_ref(repo_url: str):
             "accept": "application/x-git-upload-pack-advertisement",
         },
     )
-    response = make_http_request(info_refs_request)
 
-    assert response.status_code == HTTPStatus.OK
+
+def _repository_url(response: Response, repo_url: str) -> str:
+    # Like git, the repository moved wherever the redirects of "/info/refs" took us
+    final_url = urlsplit(response.url)
+    if not final_url.path.endswith("/info/refs"):
+        return repo_url
+
+    return urlunsplit((final_url.scheme, final_url.netloc, final_url.path.removesuffix("/info/refs"), "", ""))
+
+
+def _parse_main_ref(response: Response):
+    assert response.status_code == HTTPStatus.OK, f"Unexpected status {response.status_code}"
     assert response.content_type() == "application/x-git-upload-pack-advertisement"
 
     response_body = response.body.split(b"\n")
@@ -58,15 +80,53 @@ def _create_want_command(wanted_content_sha1):
     return f"{length}want {wanted_content_sha1}\n"
 
 
-def download_pack_file(url, sha_1):
+def _create_have_command(common_content_sha1):
+    # each line has the format "{4 bytes HEX for content length}have {sha1 of content we already have}\n"
+    length = hex(4 + 4 + 1 + len(common_content_sha1) + 1)[2:].zfill(4)
+    return f"{length}have {common_content_sha1}\n"
+
+
+def _skip_acknowledgments(response: memoryview) -> memoryview:
+    # Before the pack the server sends one pkt-line per negotiation answer: "NAK\n" or "ACK {sha1}\n",
+    # or "ERR {message}" when it can't serve the request
+    while response[:4] != b"PACK":
+        if not response:
+            raise RuntimeError("The server didn't send a pack-file")
+        length = int(bytes(response[:4]), 16)
+        if response[4:8] == b"ERR ":
+            message = bytes(response[8:length]).decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"The server answered with an error: {message}")
+        # flush-pkt "0000" has no content
+        response = response[max(length, 4):]
+
+    return response
+
+
+def download_pack_file(url, sha_1, haves=()):
+    """
+    `haves` are commits already in our object store, the server won't send any object reachable from them.
+    Returns the whole pack-file, header and trailer included, without checking its checksum
+    """
+    response = make_http_request(_upload_pack_request(url, sha_1, haves))
+    return _parse_pack_file(response)
+
+
+async def download_pack_file_async(url, sha_1, haves=()):
+    response = await make_async_http_request(_upload_pack_request(url, sha_1, haves))
+    return _parse_pack_file(response)
+
+
+def _upload_pack_request(url, sha_1, haves) -> PostRequest:
     capabilities = ''.join(CAPABILITIES)
     data = ''.join([
         _create_want_command(f'{sha_1} {capabilities}'),
         _create_want_command(sha_1),
-        "00000009done\n"
+        "0000",
+        *[_create_have_command(have) for have in haves],
+        "0009done\n"
     ]).encode()
 
-    upload_pack_request = PostRequest(
+    return PostRequest(
         base_url=url + "/git-upload-pack",
         url_params={},
         headers={
@@ -76,12 +136,13 @@ def download_pack_file(url, sha_1):
         body=data,
     )
 
-    response = make_http_request(upload_pack_request)
-    assert response.status_code == HTTPStatus.OK
+
+def _parse_pack_file(response: Response):
+    assert response.status_code == HTTPStatus.OK, f"Unexpected status {response.status_code}"
     assert response.content_type() == "application/x-git-upload-pack-result"
 
-    # remove "0008NAK\n"
-    response = response.body[8:]
+    # remove "0008NAK\n" or the ACKs of the haves, the memoryview avoids copying the pack for every slice
+    response = _skip_acknowledgments(memoryview(response.body))
 
     magic = response[:4]
     assert magic == b"PACK"
@@ -90,6 +151,5 @@ def download_pack_file(url, sha_1):
     n_items = struct.unpack('>I', response[8:12])[0]
     assert n_items > 0
 
-    # TODO: check checksum
-    # Skip magic + version + n_items and last 20 bytes for checksum
-    return response[12:-20], n_items
+    # Checking the trailer hashes the whole pack, which is left to whoever unpacks it, see `verify_pack_checksum`
+    return response, n_items
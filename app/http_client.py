@@ -1,14 +1,21 @@
+import asyncio
+import inspect
 import logging
+import ssl
 import tempfile
 from functools import wraps
 from http import HTTPStatus, HTTPMethod
 from typing import NamedTuple, Iterable, Callable
 from urllib.error import HTTPError
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urljoin, urlsplit
 from urllib.request import Request as HTTPRequest, urlopen
 
 _logger = logging.getLogger(__name__)
 
+TIMEOUT = 5
+MAX_REDIRECTS = 5
+_READ_SIZE = 64 * 1024
+
 
 class GetRequest(NamedTuple):
     base_url: str
@@ -24,49 +31,65 @@ class PostRequest(NamedTuple):
 
 
 class Response:
-    def __init__(self, status_code: HTTPStatus, headers: Iterable[tuple[str, str]], body: bytes):
+    def __init__(self, status_code: HTTPStatus, headers: Iterable[tuple[str, str]], body: bytes, url: str = ""):
         self.status_code = status_code
         self.headers = {key.lower(): value for key, value in headers}
         self.body = body
+        # URL that answered, after following redirects
+        self.url = url
 
     def content_type(self):
         return self.headers["content-type"]
 
 
-# Custom decorator to log requests and responses
+# Custom decorator to log requests and responses, works with both blocking and async clients
 def log_request(http_request: Callable[[GetRequest | PostRequest], Response]):
+    if inspect.iscoroutinefunction(http_request):
+        @wraps(http_request)
+        async def decorated_async(request: GetRequest | PostRequest) -> Response:
+            _log_request(request)
+            response = await http_request(request)
+            _log_response(response)
+            return response
+
+        return decorated_async
+
     @wraps(http_request)
     def decorated(request: GetRequest | PostRequest) -> Response:
-        match request:
-            case GetRequest():
-                method = HTTPMethod.GET
-                body = None
-            case PostRequest():
-                method = HTTPMethod.POST
-                body = _body_as_str(request.body)
-
-        # Request
-        _logger.debug("Making request:")
-        _logger.debug(f" method:  {method}")
-        _logger.debug(f" url:     {request.base_url}")
-        _logger.debug(f" headers: {request.headers}")
-        _logger.debug(f" params:  {request.url_params}")
-        if body:
-            _logger.debug(f" body:    {body}")
-
+        _log_request(request)
         response = http_request(request)
-
-        # Response
-        _logger.debug("Received:")
-        _logger.debug(" status_code: %s", response.status_code)
-        _logger.debug(" headers:     %s", response.headers)
-        _logger.debug(" body_len:    %s", len(response.body))
-        _logger.debug(" body:        %s", _body_as_str(response.body))
+        _log_response(response)
         return response
 
     return decorated
 
 
+def _log_request(request: GetRequest | PostRequest) -> None:
+    match request:
+        case GetRequest():
+            method = HTTPMethod.GET
+            body = None
+        case PostRequest():
+            method = HTTPMethod.POST
+            body = _body_as_str(request.body)
+
+    _logger.debug("Making request:")
+    _logger.debug(f" method:  {method}")
+    _logger.debug(f" url:     {request.base_url}")
+    _logger.debug(f" headers: {request.headers}")
+    _logger.debug(f" params:  {request.url_params}")
+    if body:
+        _logger.debug(f" body:    {body}")
+
+
+def _log_response(response: Response) -> None:
+    _logger.debug("Received:")
+    _logger.debug(" status_code: %s", response.status_code)
+    _logger.debug(" headers:     %s", response.headers)
+    _logger.debug(" body_len:    %s", len(response.body))
+    _logger.debug(" body:        %s", _body_as_str(response.body))
+
+
 def _body_as_str(body: bytes) -> str:
     try:
         body_str = body.decode("utf-8")
@@ -98,8 +121,122 @@ def make_http_request(request: GetRequest | PostRequest) -> Response:
             req.data = request.body
 
     try:
-        with urlopen(req, timeout=5) as res:
+        with urlopen(req, timeout=TIMEOUT) as res:
             status_code = HTTPStatus(res.status)
-            return Response(status_code, res.getheaders(), res.read())
+            return Response(status_code, res.getheaders(), res.read(), res.geturl())
     except HTTPError as e:
-        return Response(HTTPStatus(e.code), e.headers.items(), bytes())
+        return Response(HTTPStatus(e.code), e.headers.items(), bytes(), e.geturl())
+
+
+@log_request
+async def make_async_http_request(request: GetRequest | PostRequest) -> Response:
+    """
+    Same as `make_http_request`, but the socket is driven by the asyncio event loop instead of blocking on it.
+    Speaks just enough HTTP/1.1 for the smart protocol: one request per connection, fixed length or chunked bodies
+    """
+    url = f"{request.base_url}?{urlencode(request.url_params)}"
+
+    for _ in range(MAX_REDIRECTS + 1):
+        status_code, headers, body = await _async_round_trip(url, request)
+        response = Response(status_code, headers, body, url)
+
+        # Like urlopen, only follow redirects of requests without a body
+        location = response.headers.get("location")
+        if location and isinstance(request, GetRequest) and status_code in (
+                HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.FOUND, HTTPStatus.SEE_OTHER,
+                HTTPStatus.TEMPORARY_REDIRECT, HTTPStatus.PERMANENT_REDIRECT):
+            url = urljoin(url, location)
+            continue
+
+        # Like urlopen, error responses don't carry a body
+        if status_code >= HTTPStatus.BAD_REQUEST:
+            response.body = bytes()
+        return response
+
+    raise RuntimeError(f"Too many redirects for {request.base_url}")
+
+
+async def _async_round_trip(url: str, request: GetRequest | PostRequest) -> tuple[HTTPStatus, list, bytes]:
+    parts = urlsplit(url)
+    is_https = parts.scheme == "https"
+    port = parts.port or (443 if is_https else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if is_https else None),
+        TIMEOUT,
+    )
+
+    try:
+        match request:
+            case GetRequest():
+                method = HTTPMethod.GET
+                body = bytes()
+            case PostRequest():
+                method = HTTPMethod.POST
+                body = request.body
+
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+        lines.extend(f"{key}: {value}" for key, value in request.headers.items())
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        # Status line is "HTTP/1.1 {status code} {reason}"
+        status_line = await _read(reader.readline())
+        status_code = HTTPStatus(int(status_line.split(b" ", maxsplit=2)[1]))
+
+        headers = list()
+        while (line := await _read(reader.readline())) not in (b"\r\n", b"\n", b""):
+            key, value = line.decode("latin-1").split(":", maxsplit=1)
+            headers.append((key.strip(), value.strip()))
+        header_values = {key.lower(): value for key, value in headers}
+
+        if header_values.get("transfer-encoding", "").lower() == "chunked":
+            response_body = await _read_chunked(reader)
+        elif "content-length" in header_values:
+            response_body = await _read_exactly(reader, int(header_values["content-length"]))
+        else:
+            response_body = await _read_until_eof(reader)
+
+        return status_code, headers, response_body
+    finally:
+        writer.close()
+
+
+async def _read(awaitable):
+    # Like the socket timeout of urlopen, the timeout applies to each read and not to the whole body
+    return await asyncio.wait_for(awaitable, TIMEOUT)
+
+
+async def _read_exactly(reader: asyncio.StreamReader, size: int) -> bytes:
+    body = bytearray()
+    while len(body) < size:
+        body.extend(await _read(reader.readexactly(min(_READ_SIZE, size - len(body)))))
+
+    return bytes(body)
+
+
+async def _read_until_eof(reader: asyncio.StreamReader) -> bytes:
+    body = bytearray()
+    while chunk := await _read(reader.read(_READ_SIZE)):
+        body.extend(chunk)
+
+    return bytes(body)
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    # Each chunk is "{size in HEX}[;extensions]\r\n{data}\r\n", the last one has size 0 and is followed by trailers
+    body = bytearray()
+    while True:
+        size_line = await _read(reader.readline())
+        size = int(size_line.split(b";", maxsplit=1)[0], 16)
+        if size == 0:
+            break
+        body.extend(await _read_exactly(reader, size))
+        await _read(reader.readexactly(2))
+
+    while await _read(reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+
+    return bytes(body)
@@ -1,14 +1,18 @@
+import asyncio
 import logging
+import sys
+import time
 from datetime import datetime
 from pathlib import Path
 
 from app.argument_parsing import argument_parser
 from app.entities.git_commit import Commit
-from app.entities.git_object import retrieve_object_by_id, GitObject, ObjectType
-from app.entities.git_pack_file import unpack_objects
-from app.entities.git_ref import Ref
+from app.entities.git_object import retrieve_object_by_id, GitObject, ObjectType, has_object
 from app.entities.git_tree import Tree, build_tree
+from app.fsck import fsck, verify_pack
 from app.git_smart_protocol import download_pack_file, get_main_ref
+from app.mirror import mirror, read_mirror_list
+from app.repository import create_git_dirs, prepare_clone, finish_clone
 
 
 def is_debug():
@@ -16,27 +20,9 @@ def is_debug():
     return "debug: true" in codecrafters_yml
 
 
-def create_git_dirs(target_dir: Path) -> None:
-    # Check that the target directory exists
-    assert target_dir.is_dir()
-    assert target_dir.exists()
-
-    # Check that the target directory does not have a .git folder
-    dot_git = target_dir / ".git"
-    assert not dot_git.exists()
-    dot_git.mkdir()
-
-    # Create the required folders
-    (dot_git / "objects").mkdir()
-    (dot_git / "refs").mkdir()
-    (dot_git / "refs" / "heads").mkdir()
-
-    # Create the HEAD file
-    Ref("HEAD", "ref: refs/heads/master").store(dot_git)
-
-
 def main():
-    args = argument_parser().parse_args()
+    parser = argument_parser()
+    args = parser.parse_args()
     logging.basicConfig(level=logging.DEBUG if is_debug() else logging.INFO)
 
     if args.command == "init":
@@ -76,28 +62,41 @@ def main():
         commit_object = commit.to_git_object()
         commit_object.store(dot_git)
         print(commit_object.object_id)
+    elif args.command == "clone" and args.many:
+        repositories = read_mirror_list(Path(args.many))
+        reference_path = Path(args.reference) if args.reference else None
+        failed = asyncio.run(mirror(repositories, reference_path, args.jobs, args.per_host, args.workers))
+        if failed:
+            sys.exit(1)
     elif args.command == "clone":
+        if args.url is None or args.path is None:
+            parser.error("clone requires url and path unless --many is given")
+
         # Create the directory for the clone
         clone_path = Path() / args.path
-        clone_path.mkdir()
-        create_git_dirs(clone_path)
-
-        # Fetch pack-file
-        master_sha1 = get_main_ref(args.url).decode('utf-8')
-        pack_file, n_items = download_pack_file(args.url, master_sha1)
-
-        # Unpack objects
-        git_objects = list(unpack_objects(pack_file))
-
-        # Create objects inside .git folder
-        dot_git = clone_path / ".git"
-        for git_object in git_objects:
-            git_object.store(dot_git)
-
-        # Build the tree
-        master_commit = Commit.from_git_object(retrieve_object_by_id(dot_git, master_sha1))
-        root_tree = Tree.from_git_object(retrieve_object_by_id(dot_git, master_commit.tree_id))
-        root_tree.restore(dot_git, clone_path)
+        haves = prepare_clone(clone_path, Path(args.reference) if args.reference else None)
+
+        master_sha1, repo_url = get_main_ref(args.url)
+        master_sha1 = master_sha1.decode('utf-8')
+        pack_file = None
+        # The reference may already have everything we want
+        if not has_object(clone_path / ".git", master_sha1):
+            # Fetch pack-file
+            pack_file, _ = download_pack_file(repo_url, master_sha1, haves)
+
+        finish_clone(clone_path, master_sha1, pack_file)
+    elif args.command in ("fsck", "verify-pack"):
+        start = time.perf_counter()
+        if args.command == "fsck":
+            report = fsck(Path() / ".git", args.jobs)
+        else:
+            report = verify_pack(Path(args.pack).with_suffix(".pack"), args.jobs)
+
+        for error in report.errors:
+            print(error)
+        print(report.summary(time.perf_counter() - start))
+        if report.errors:
+            sys.exit(1)
     else:
         raise RuntimeError(f"Unknown command: {args.command}")
 
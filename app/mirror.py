@@ -0,0 +1,144 @@
+import asyncio
+import shutil
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+from app.entities.git_object import has_object
+from app.git_smart_protocol import download_pack_file_async, get_main_ref_async
+from app.repository import prepare_clone, finish_spooled_clone, get_spooled_pack_path
+
+
+class MirroredRepository(NamedTuple):
+    url: str
+    path: Path
+
+
+def read_mirror_list(mirror_list: Path) -> list[MirroredRepository]:
+    repositories = list()
+
+    for line in mirror_list.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        # Each line is "{url} [{path}]", by default the path is the last part of the URL, like git clone does
+        url, *path = line.split(maxsplit=1)
+        if not path:
+            path = [url.rstrip("/").rsplit("/", maxsplit=1)[-1].removesuffix(".git")]
+        repositories.append(MirroredRepository(url, Path() / path[0]))
+
+    return repositories
+
+
+class _ConnectionLimits:
+    def __init__(self, max_connections: int, max_connections_per_host: int):
+        self._all_hosts = asyncio.Semaphore(max_connections)
+        self._max_connections_per_host = max_connections_per_host
+        self._per_host: dict[str, asyncio.Semaphore] = dict()
+
+    def for_host(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._per_host:
+            self._per_host[host] = asyncio.Semaphore(self._max_connections_per_host)
+        return self._per_host[host]
+
+    @property
+    def all_hosts(self) -> asyncio.Semaphore:
+        return self._all_hosts
+
+
+async def _mirror_repository(
+        repository: MirroredRepository,
+        reference_path: Path | None,
+        limits: _ConnectionLimits,
+        executor: Executor,
+) -> str:
+    start = time.perf_counter()
+
+    # Targets are only left behind by finished clones, so re-running a mirror list retries just the failed ones
+    if repository.path.exists():
+        return "already exists, skipped"
+
+    try:
+        haves = prepare_clone(repository.path, reference_path)
+        return await _clone_repository(repository, haves, limits, executor, start)
+    except BaseException:
+        shutil.rmtree(repository.path, ignore_errors=True)
+        raise
+
+
+async def _clone_repository(
+        repository: MirroredRepository,
+        haves: list[str],
+        limits: _ConnectionLimits,
+        executor: Executor,
+        start: float,
+) -> str:
+    loop = asyncio.get_running_loop()
+
+    # Only the network phase holds a connection slot, the host one is taken first,
+    # so repositories waiting on a busy host don't block the ones on other hosts
+    async with limits.for_host(repository.url), limits.all_hosts:
+        connected = time.perf_counter()
+        master_sha1, repo_url = await get_main_ref_async(repository.url)
+        master_sha1 = master_sha1.decode('utf-8')
+        refs_done = time.perf_counter()
+
+        pack_path, pack_size = None, 0
+        # The reference may already have everything we want
+        if not has_object(repository.path / ".git", master_sha1):
+            pack_file, _ = await download_pack_file_async(repo_url, master_sha1, haves)
+            pack_size = len(pack_file)
+
+            # Downloads run ahead of the workers, so packs wait for them on disk instead of piling up in memory
+            pack_path = get_spooled_pack_path(repository.path)
+            await loop.run_in_executor(None, pack_path.write_bytes, pack_file)
+            del pack_file
+        download_done = time.perf_counter()
+
+    # Inflating, resolving deltas and writing files is CPU-bound, so it runs outside the event loop
+    n_stored = await loop.run_in_executor(executor, finish_spooled_clone, repository.path, master_sha1, pack_path)
+    done = time.perf_counter()
+
+    return (
+        f"{n_stored} objects, {pack_size / 1024:.1f} KiB, "
+        f"queued {connected - start:.2f}s, refs {refs_done - connected:.2f}s, "
+        f"pack {download_done - refs_done:.2f}s, checkout {done - download_done:.2f}s, total {done - start:.2f}s"
+    )
+
+
+async def mirror(
+        repositories: list[MirroredRepository],
+        reference_path: Path | None,
+        max_connections: int,
+        max_connections_per_host: int,
+        workers: int,
+) -> int:
+    """
+    Clones all the repositories concurrently, returns the number of them that failed
+    """
+    start = time.perf_counter()
+    limits = _ConnectionLimits(max_connections, max_connections_per_host)
+    n_done = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        async def mirror_and_report(repository: MirroredRepository) -> bool:
+            nonlocal n_done
+            # One failing repository must not stop the others
+            try:
+                summary, ok = await _mirror_repository(repository, reference_path, limits, executor), True
+            except Exception as e:
+                summary, ok = f"failed: {e!r}", False
+            n_done += 1
+            print(f"[{n_done}/{len(repositories)}] {repository.url} -> {repository.path}: {summary}", flush=True)
+            return ok
+
+        results = await asyncio.gather(*[mirror_and_report(repository) for repository in repositories])
+
+    n_failed = results.count(False)
+    print(f"Mirrored {len(repositories) - n_failed}/{len(repositories)} repositories "
+          f"in {time.perf_counter() - start:.2f}s")
+    return n_failed
@@ -0,0 +1,102 @@
+from pathlib import Path
+
+from app.entities.git_commit import Commit
+from app.entities.git_object import (
+    retrieve_object_by_id, has_object, get_alternates_path, alternate_object_directories,
+)
+from app.entities.git_pack_file import unpack_objects, verify_pack_checksum
+from app.entities.git_ref import Ref, read_refs
+from app.entities.git_tree import Tree
+
+
+def create_git_dirs(target_dir: Path) -> None:
+    # Check that the target directory exists
+    assert target_dir.is_dir()
+    assert target_dir.exists()
+
+    # Check that the target directory does not have a .git folder
+    dot_git = target_dir / ".git"
+    assert not dot_git.exists()
+    dot_git.mkdir()
+
+    # Create the required folders
+    (dot_git / "objects").mkdir()
+    (dot_git / "refs").mkdir()
+    (dot_git / "refs" / "heads").mkdir()
+
+    # Create the HEAD file
+    Ref("HEAD", "ref: refs/heads/master").store(dot_git)
+
+
+def add_reference(dot_git: Path, reference_path: Path) -> list[str]:
+    """
+    Shares the objects of the reference repository through objects/info/alternates,
+    returns the commits it has, so they can be advertised as "have"s
+    """
+    reference_dot_git = reference_path / ".git"
+    # Bare repositories don't have a .git folder
+    if not reference_dot_git.is_dir():
+        reference_dot_git = reference_path
+    reference_objects = reference_dot_git / "objects"
+    assert reference_objects.is_dir()
+
+    alternates = get_alternates_path(dot_git)
+    alternates.parent.mkdir(exist_ok=True)
+    alternates.write_text(f"{reference_objects.resolve()}\n")
+
+    haves = {ref.target for ref in read_refs(reference_dot_git)}
+    alternate_dirs = alternate_object_directories(dot_git)
+    return sorted(have for have in haves if has_object(dot_git, have, alternate_dirs))
+
+
+def prepare_clone(clone_path: Path, reference_path: Path | None) -> list[str]:
+    """
+    Creates the repository for the clone, returns the commits to advertise as "have"s
+    """
+    clone_path.mkdir()
+    create_git_dirs(clone_path)
+
+    if reference_path is None:
+        return []
+    return add_reference(clone_path / ".git", reference_path)
+
+
+def finish_clone(clone_path: Path, commit_sha1: str, pack_file: bytes | memoryview | None) -> int:
+    """
+    Checks and stores the objects of the pack-file, if we had to download one, and checks out the commit.
+    This is the CPU-bound part of a clone, returns the number of objects written
+    """
+    dot_git = clone_path / ".git"
+    n_stored = 0
+
+    if pack_file is not None:
+        alternate_dirs = alternate_object_directories(dot_git)
+        # Create objects inside .git folder, skipping the ones shared with the reference
+        for git_object in unpack_objects(verify_pack_checksum(pack_file)):
+            if not has_object(dot_git, git_object.object_id, alternate_dirs):
+                git_object.store(dot_git)
+                n_stored += 1
+    Ref("refs/heads/master", commit_sha1).store(dot_git)
+
+    # Build the tree
+    commit = Commit.from_git_object(retrieve_object_by_id(dot_git, commit_sha1))
+    root_tree = Tree.from_git_object(retrieve_object_by_id(dot_git, commit.tree_id))
+    root_tree.restore(dot_git, clone_path)
+
+    return n_stored
+
+
+def get_spooled_pack_path(clone_path: Path) -> Path:
+    return clone_path / ".git" / "tmp_pack"
+
+
+def finish_spooled_clone(clone_path: Path, commit_sha1: str, pack_path: Path | None) -> int:
+    """
+    Same as `finish_clone`, for packs waiting on disk for a worker instead of in memory
+    """
+    pack_file = None
+    if pack_path is not None:
+        pack_file = pack_path.read_bytes()
+        pack_path.unlink()
+
+    return finish_clone(clone_path, commit_sha1, pack_file)